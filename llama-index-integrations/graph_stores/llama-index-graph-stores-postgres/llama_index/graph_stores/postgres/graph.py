@@ -1,47 +1,58 @@
 """PostgreSQL graph store index."""
-from typing import Tuple, Any, List, Optional, Dict
+from typing import Tuple, Any, Iterator, List, Optional, Dict
 from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
 from sqlalchemy import (
     create_engine,
     Column,
+    Executable,
     Integer,
     String,
     DateTime,
     ForeignKey,
+    Index,
     Text,
+    UniqueConstraint,
     sql,
     delete,
 )
+from sqlalchemy.dialects.postgresql import ARRAY
 from sqlalchemy.orm import (
     Session,
     declarative_base,
     relationship,
-    joinedload,
 )
 
 from llama_index.core.graph_stores.types import GraphStore
-from llama_index.graph_stores.postgres.utils import check_db_availability, get_or_create
+from llama_index.graph_stores.postgres.utils import (
+    check_db_availability,
+    get_or_create_ids,
+    upgrade_constraints,
+    upgrade_indexes,
+)
 
 
 rel_depth_query = """
 WITH RECURSIVE PATH AS
   (SELECT 1 AS depth,
+          e.name AS root,
           r.subject_id,
           r.object_id,
           r.description
    FROM {relation_table} r
-   WHERE r.subject_id IN
-       (SELECT id
-        FROM {entity_table}
-        WHERE name = ANY(:subjs) )
+   JOIN {entity_table} e ON r.subject_id = e.id
+   WHERE e.name = ANY(:subjs)
    UNION ALL SELECT p.depth + 1,
+                    p.root,
                     r.subject_id,
                     r.object_id,
                     r.description
    FROM PATH p
    JOIN {relation_table} r ON p.object_id = r.subject_id
    WHERE p.depth < :depth )
-SELECT p.depth,
+SELECT DISTINCT p.depth,
+       p.root,
        e1.name AS subject,
        p.description,
        e2.name AS object
@@ -52,6 +63,10 @@ ORDER BY p.depth
 LIMIT :limit;
 """
 
+# the sessions of the `bulk_session` blocks open in the current thread or task, by
+# store, so that concurrent callers never write through each other's session
+_bulk_sessions: ContextVar[Dict[int, Session]] = ContextVar("bulk_sessions")
+
 
 class PostgresGraphStore(GraphStore):
     def __init__(
@@ -66,6 +81,13 @@ class PostgresGraphStore(GraphStore):
         self._entity_table_name = entity_table_name
         self._relation_table_name = relation_table_name
         self._entity_model, self._rel_model = self.init_schema()
+        # table names are fixed per store, so the traversal is built only once
+        self._rel_depth_stmt = sql.text(
+            rel_depth_query.format(
+                relation_table=self._relation_table_name,
+                entity_table=self._entity_table_name,
+            )
+        ).bindparams(sql.bindparam("subjs", type_=ARRAY(String)))
 
     def init_schema(self) -> Tuple[Any, Any]:
         """Initialize schema."""
@@ -75,7 +97,7 @@ class PostgresGraphStore(GraphStore):
             __tablename__ = self._entity_table_name
 
             id = Column(Integer, primary_key=True)
-            name = Column(String(512), nullable=False)
+            name = Column(String(512), nullable=False, unique=True)
             created_at = Column(DateTime, nullable=False, server_default=sql.func.now())
             updated_at = Column(
                 DateTime,
@@ -86,6 +108,12 @@ class PostgresGraphStore(GraphStore):
 
         class RelationshipModel(Base):
             __tablename__ = self._relation_table_name
+            # the unique constraint also serves lookups by `subject_id`, so only
+            # `object_id` needs an index of its own
+            __table_args__ = (
+                UniqueConstraint("subject_id", "object_id", "description"),
+                Index(f"ix_{self._relation_table_name}_object_id", "object_id"),
+            )
 
             id = Column(Integer, primary_key=True)
             description = Column(Text, nullable=False)
@@ -103,6 +131,17 @@ class PostgresGraphStore(GraphStore):
             object = relationship("EntityModel", foreign_keys=[object_id])
 
         Base.metadata.create_all(self._engine)
+        with self._engine.begin() as conn:
+            # create_all skips tables that exist, add the constraints and indexes
+            # introduced since then
+            upgraded = False
+            for table in Base.metadata.sorted_tables:
+                upgraded |= upgrade_constraints(conn, table)
+                upgraded |= upgrade_indexes(conn, table)
+            if upgraded:
+                # refresh planner statistics so the new indexes are used right away
+                tables = f"{self._entity_table_name}, {self._relation_table_name}"
+                conn.execute(sql.text(f"ANALYZE {tables}"))
         return EntityModel, RelationshipModel
 
     @property
@@ -110,32 +149,76 @@ class PostgresGraphStore(GraphStore):
         """Get client."""
         return self._engine
 
+    @contextmanager
+    def bulk_session(self) -> Iterator[Session]:
+        """
+        Run the writes made inside the block in a single transaction.
+
+        Reads use their own sessions and only see the writes once the block exits.
+        The block is local to the calling thread or task, writes made concurrently
+        from elsewhere run in transactions of their own.
+        """
+        sessions = _bulk_sessions.get({})
+        if id(self) in sessions:
+            yield sessions[id(self)]
+            return
+
+        with Session(self._engine) as session, session.begin():
+            token = _bulk_sessions.set({**sessions, id(self): session})
+            try:
+                yield session
+            finally:
+                _bulk_sessions.reset(token)
+
     def upsert_triplet(self, subj: str, rel: str, obj: str) -> None:
         """Add triplet."""
-        with Session(self._engine) as session:
-            subj_instance, _ = get_or_create(session, self._entity_model, name=subj)
-            obj_instance, _ = get_or_create(session, self._entity_model, name=obj)
-            get_or_create(
+        self.upsert_triplets([(subj, rel, obj)])
+
+    def upsert_triplets(self, triplets: List[Tuple[str, str, str]]) -> None:
+        """Add triplets in one statement per table."""
+        if not triplets:
+            return
+
+        with self.bulk_session() as session:
+            names = sorted({name for subj, _, obj in triplets for name in (subj, obj)})
+            entity_ids, _ = get_or_create_ids(
+                session,
+                self._entity_model,
+                ["name"],
+                [{"name": name} for name in names],
+            )
+            ids = dict(zip(names, entity_ids))
+            get_or_create_ids(
                 session,
                 self._rel_model,
-                description=rel,
-                subject=subj_instance,
-                object=obj_instance,
+                ["subject_id", "object_id", "description"],
+                [
+                    {
+                        "description": rel,
+                        "subject_id": ids[subj],
+                        "object_id": ids[obj],
+                    }
+                    for subj, rel, obj in triplets
+                ],
             )
 
     def get(self, subj: str) -> List[List[str]]:
         """Get triplets."""
+        subjects = self._entity_model.__table__.alias("subjects")
+        objects = self._entity_model.__table__.alias("objects")
+        relation = self._rel_model.__table__
+        stmt = (
+            sql.select(relation.c.description, objects.c.name)
+            .select_from(relation)
+            .join(subjects, relation.c.subject_id == subjects.c.id)
+            .join(objects, relation.c.object_id == objects.c.id)
+            .where(subjects.c.name == subj)
+        )
         with Session(self._engine) as session:
-            rels = (
-                session.query(self._rel_model)
-                .options(
-                    joinedload(self._rel_model.subject),
-                    joinedload(self._rel_model.object),
-                )
-                .filter(self._rel_model.subject.has(name=subj))
-                .all()
-            )
-            return [[rel.description, rel.object.name] for rel in rels]
+            # as an execution option, yield_per also streams from a server-side
+            # cursor instead of only batching rows already fetched
+            result = session.execute(stmt.execution_options(yield_per=1000))
+            return [[description, name] for description, name in result]
 
     def get_rel_map(
         self, subjs: Optional[List[str]] = None, depth: int = 2, limit: int = 30
@@ -143,79 +226,92 @@ class PostgresGraphStore(GraphStore):
         """Get depth-aware rel map."""
         rel_map: Dict[str, List[List[str]]] = defaultdict(list)
         with Session(self._engine) as session:
-            # `raw_rels`` is a list of tuples (depth, subject, description, object), ordered by depth
+            # `raw_rels` is a list of tuples (depth, root, subject, description,
+            # object) ordered by depth, `root` is the one of `subjs` the path started at
             # Example:
-            # +-------+------------------+------------------+------------------+
-            # | depth | subject          | description      | object           |
-            # +-------+------------------+------------------+------------------+
-            # |     1 | Software         | Mention in       | Footnotes        |
-            # |     1 | Viaweb           | Started by       | Paul graham      |
-            # |     2 | Paul graham      | Invited to       | Lisp conference  |
-            # |     2 | Paul graham      | Coded            | Bel              |
-            # +-------+------------------+------------------+------------------+
+            # +-------+-------------+-------------+-------------+-----------------+
+            # | depth | root        | subject     | description | object          |
+            # +-------+-------------+-------------+-------------+-----------------+
+            # |     1 | Software    | Software    | Mention in  | Footnotes       |
+            # |     1 | Viaweb      | Viaweb      | Started by  | Paul graham     |
+            # |     2 | Viaweb      | Paul graham | Invited to  | Lisp conference |
+            # |     2 | Viaweb      | Paul graham | Coded       | Bel             |
+            # +-------+-------------+-------------+-------------+-----------------+
             raw_rels = session.execute(
-                sql.text(
-                    rel_depth_query.format(
-                        relation_table=self._relation_table_name,
-                        entity_table=self._entity_table_name,
-                    )
-                ),
+                self._rel_depth_stmt,
                 {
                     "subjs": subjs,
                     "depth": depth,
                     "limit": limit,
                 },
-            ).fetchall()
-            # `obj_reverse_map` is a dict of sets, where the key is a tuple (object, depth)
-            # and the value is a set of subjects that have the object at the previous depth
-            obj_reverse_map = defaultdict(set)
-            for depth, subj, rel, obj in raw_rels:
-                if depth == 1:
-                    rel_map[subj].append([subj, rel, obj])
-                    obj_reverse_map[(obj, depth)].update([subj])
-                else:
-                    for _subj in obj_reverse_map[(subj, depth - 1)]:
-                        rel_map[_subj].append([subj, rel, obj])
-                        obj_reverse_map[(obj, depth)].update([_subj])
+            )
+            for _, root, subj, rel, obj in raw_rels:
+                rel_map[root].append([subj, rel, obj])
             return dict(rel_map)
 
     def delete(self, subj: str, rel: str, obj: str) -> None:
         """Delete triplet."""
-        with Session(self._engine) as session:
+        with self.bulk_session() as session:
             stmt = delete(self._rel_model).where(
                 self._rel_model.subject.has(name=subj),
                 self._rel_model.description == rel,
                 self._rel_model.object.has(name=obj),
             )
             result = session.execute(stmt)
-            session.commit()
             # no rows affected, do not need to delete entities
             if result.rowcount == 0:
                 return
 
-            def delete_entity(entity_name: str):
+            def delete_entity(entity_name: str) -> None:
                 stmt = delete(self._entity_model).where(
                     self._entity_model.name == entity_name
                 )
                 session.execute(stmt)
-                session.commit()
-
-            def entity_was_referenced(entity_name: str):
-                return (
-                    session.query(self._rel_model)
-                    .filter(
-                        self._rel_model.subject.has(name=entity_name)
-                        | self._rel_model.object.has(name=entity_name)
-                    )
-                    .one_or_none()
+
+            def entity_was_referenced(entity_name: str) -> bool:
+                # an EXISTS on the ids, instead of loading the referencing relations
+                entity_id = (
+                    sql.select(self._entity_model.id)
+                    .where(self._entity_model.name == entity_name)
+                    .scalar_subquery()
                 )
+                return session.execute(
+                    sql.select(
+                        sql.exists().where(
+                            (self._rel_model.subject_id == entity_id)
+                            | (self._rel_model.object_id == entity_id)
+                        )
+                    )
+                ).scalar_one()
 
             if not entity_was_referenced(subj):
                 delete_entity(subj)
             if not entity_was_referenced(obj):
                 delete_entity(obj)
 
-    def query(self, query: str, param_map: Optional[Dict[str, Any]] = {}) -> Any:
-        """Query the graph store with statement and parameters."""
+    def query(
+        self,
+        query: str,
+        param_map: Optional[Dict[str, Any]] = {},
+        stream: bool = False,
+    ) -> Any:
+        """
+        Query the graph store with statement and parameters.
+
+        With `stream=True` the rows are returned as an iterator, fetched in batches
+        through a server-side cursor instead of being buffered all at once.
+        """
+        statement = sql.text(query) if isinstance(query, str) else query
+        if stream:
+            return self._stream_query(statement, param_map)
+
         with Session(self._engine) as session:
-            return session.execute(query, param_map).fetchall()
+            return session.execute(statement, param_map).fetchall()
+
+    def _stream_query(
+        self, statement: Executable, param_map: Optional[Dict[str, Any]] = {}
+    ) -> Iterator[Any]:
+        with self._engine.connect() as conn:
+            # yield_per implies stream_results, i.e. a server-side cursor
+            conn = conn.execution_options(yield_per=1000)
+            yield from conn.execute(statement, param_map)
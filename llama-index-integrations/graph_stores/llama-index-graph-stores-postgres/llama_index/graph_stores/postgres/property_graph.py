@@ -1,6 +1,7 @@
 """PostgreSQL property graph store index."""
+import asyncio
 import json
-from typing import Tuple, Optional, List, Dict, Any
+from typing import Tuple, Optional, List, Dict, Any, Literal, Sequence
 from sqlalchemy import (
     Text,
     create_engine,
@@ -10,18 +11,26 @@ from sqlalchemy import (
     DateTime,
     TEXT,
     ForeignKey,
+    Index,
+    Row,
+    UniqueConstraint,
+    exc,
     sql,
     delete,
+    event as sql_event,
+    make_url,
 )
-from sqlalchemy.dialects.postgresql import JSONB
-from sqlalchemy.orm import (
-    Session,
-    declarative_base,
-    relationship,
-    joinedload,
+from sqlalchemy.dialects.postgresql import ARRAY, JSONB, insert
+from sqlalchemy.ext.asyncio import (
+    AsyncEngine,
+    AsyncSession,
+    async_sessionmaker,
+    create_async_engine,
 )
+from sqlalchemy.orm import declarative_base, sessionmaker
+from sqlalchemy.types import UserDefinedType
 
-from pgvector.sqlalchemy import Vector
+from pgvector.sqlalchemy import HALFVEC, Vector
 from llama_index.core.graph_stores.types import (
     PropertyGraphStore,
     LabelledNode,
@@ -34,7 +43,9 @@ from llama_index.core.graph_stores.types import (
 from llama_index.graph_stores.postgres.utils import (
     check_db_availability,
     remove_empty_values,
-    get_or_create,
+    strip_empty_values,
+    upgrade_constraints,
+    upgrade_indexes,
 )
 
 
@@ -73,6 +84,64 @@ LIMIT :limit;
 """
 
 
+# SQLSTATE for a missing type or operator class, e.g. halfvec before pgvector 0.7
+_PGCODE_UNDEFINED_OBJECT = "42704"
+# the options of `create_engine_kwargs` passed on to the async engine, the others
+# may only be understood by the sync driver
+_ASYNC_ENGINE_OPTIONS = frozenset(
+    (
+        "max_overflow",
+        "pool_pre_ping",
+        "pool_recycle",
+        "pool_reset_on_return",
+        "pool_size",
+        "pool_timeout",
+        "pool_use_lifo",
+    )
+)
+
+
+def _any_of(values: List[str]) -> Any:
+    """Bind `values` as one array for `col == ANY(:values)`."""
+    # unlike IN (...), the statement does not change with the number of values
+    return sql.any_(sql.literal(list(values), ARRAY(String)))
+
+
+class _BinaryVectorMixin(UserDefinedType):
+    """Leave embeddings to pgvector's binary codec when the driver is asyncpg."""
+
+    def bind_processor(self, dialect: Any) -> Any:
+        # the codec packs lists and numpy arrays as float32 directly, instead of
+        # formatting them as text for the server to parse
+        if dialect.driver == "asyncpg":
+            return None
+        return super().bind_processor(dialect)
+
+
+class _Vector(_BinaryVectorMixin, Vector):
+    cache_ok = True
+
+
+class _HalfVec(_BinaryVectorMixin, HALFVEC):
+    cache_ok = True
+
+
+def _is_undefined_halfvec(e: exc.DBAPIError) -> bool:
+    """Whether `e` is the server not knowing the halfvec type or its operators."""
+    pgcode = getattr(e.orig, "pgcode", None)
+    if pgcode is not None:
+        return pgcode == _PGCODE_UNDEFINED_OBJECT
+    # not every driver reports the SQLSTATE
+    return "halfvec" in str(e.orig)
+
+
+def _register_vector(dbapi_connection: Any, connection_record: Any) -> None:
+    # imported here, asyncpg is only installed with the `asyncpg` extra
+    from pgvector.asyncpg import register_vector
+
+    dbapi_connection.run_async(register_vector)
+
+
 class PostgresPropertyGraphStore(PropertyGraphStore):
     # PostgreSQL does not support graph cypher queries
     supports_structured_queries: bool = False
@@ -86,17 +155,159 @@ class PostgresPropertyGraphStore(PropertyGraphStore):
         relation_table_name: str = "pg_relations",
         drop_existing_table: bool = False,
         echo_queries: bool = False,
+        use_halfvec: bool = False,
+        index_type: Literal["hnsw", "ivfflat", "none"] = "none",
+        hnsw_m: Optional[int] = None,
+        hnsw_ef_construction: Optional[int] = None,
+        hnsw_ef_search: Optional[int] = None,
+        maintenance_work_mem: Optional[str] = None,
+        max_parallel_maintenance_workers: Optional[int] = None,
+        ivfflat_lists: int = 100,
+        ivfflat_probes: int = 10,
+        create_engine_kwargs: Optional[Dict[str, Any]] = None,
+        async_db_connection_string: Optional[str] = None,
     ) -> None:
+        if index_type not in ("hnsw", "ivfflat", "none"):
+            raise ValueError(
+                f"Invalid index_type: {index_type}. "
+                "Must be one of 'hnsw', 'ivfflat' or 'none'."
+            )
+        # pgvector indexes up to 2,000 dimensions of vector and 4,000 of halfvec
+        max_index_dim = 4000 if use_halfvec else 2000
+        if index_type != "none" and embedding_dim > max_index_dim:
+            raise ValueError(
+                f"{index_type} indexes support up to {max_index_dim} dimensions, "
+                f"got embedding_dim={embedding_dim}. "
+                + (
+                    "Set index_type='none' to search without an index."
+                    if use_halfvec
+                    else "Set use_halfvec=True to store the embeddings as halfvec."
+                )
+            )
+
+        # availability is checked once below, not on every pool checkout
+        engine_kwargs = {
+            "pool_pre_ping": False,
+            "insertmanyvalues_page_size": 1000,
+            **(create_engine_kwargs or {}),
+        }
+        if "poolclass" not in engine_kwargs:
+            # only the default QueuePool is sized, e.g. NullPool takes no size
+            engine_kwargs.setdefault("pool_size", 10)
+            engine_kwargs.setdefault("max_overflow", 20)
+        if make_url(db_connection_string).get_driver_name() == "psycopg2":
+            # page bulk upserts as multi-row VALUES instead of one row per message
+            engine_kwargs.setdefault("executemany_mode", "values_plus_batch")
         self._engine = create_engine(
-            db_connection_string, echo=echo_queries
+            db_connection_string, echo=echo_queries, **engine_kwargs
         )
         check_db_availability(self._engine, check_vector=True)
+        self._session = sessionmaker(self._engine, expire_on_commit=False)
+
+        # without an async driver, the async methods run the sync ones in a thread
+        self._async_db_connection_string = async_db_connection_string
+        self._async_engine_kwargs = {
+            "echo": echo_queries,
+            **{k: v for k, v in engine_kwargs.items() if k in _ASYNC_ENGINE_OPTIONS},
+        }
+        self._async_engines: Dict[asyncio.AbstractEventLoop, AsyncEngine] = {}
+        self._async_sessionmaker = async_sessionmaker(expire_on_commit=False)
 
         self._embedding_dim = embedding_dim
+        self._use_halfvec = use_halfvec
+        self._index_type = index_type
+        self._hnsw_m = hnsw_m
+        self._hnsw_ef_construction = hnsw_ef_construction
+        self._hnsw_ef_search = hnsw_ef_search
+        self._maintenance_work_mem = maintenance_work_mem
+        self._max_parallel_maintenance_workers = max_parallel_maintenance_workers
+        self._ivfflat_lists = ivfflat_lists
+        self._ivfflat_probes = ivfflat_probes
         self._node_table_name = node_table_name
         self._relation_table_name = relation_table_name
         self._drop_existing_table = drop_existing_table
         self._node_model, self._relation_model = self.init_schema()
+        self._node_table = self._node_model.__table__
+        self._relation_table = self._relation_model.__table__
+        # table names are fixed per store, so the traversal is built only once
+        self._rel_depth_stmt = sql.text(
+            rel_depth_query.format(
+                relation_table=self._relation_table_name,
+                node_table=self._node_table_name,
+            )
+        ).bindparams(sql.bindparam("ids", type_=ARRAY(String)))
+        self._build_statements()
+
+    def _create_async_engine(self) -> AsyncEngine:
+        # only called by the async methods once an async driver is configured
+        assert self._async_db_connection_string is not None
+        engine = create_async_engine(
+            self._async_db_connection_string, **self._async_engine_kwargs
+        )
+        if engine.dialect.driver == "asyncpg":
+            sql_event.listen(engine.sync_engine, "connect", _register_vector)
+        return engine
+
+    def _async_session(self) -> AsyncSession:
+        """Open a session on the async engine of the running event loop."""
+        loop = asyncio.get_running_loop()
+        engine = self._async_engines.get(loop)
+        if engine is None:
+            # pooled connections are bound to the loop that opened them, so every
+            # loop, e.g. of consecutive `asyncio.run` calls, gets an engine of its own
+            for other in list(self._async_engines):
+                if other.is_closed():
+                    # the connections of a closed loop can only be dereferenced
+                    self._async_engines.pop(other).sync_engine.dispose(close=False)
+            engine = self._async_engines[loop] = self._create_async_engine()
+        return self._async_sessionmaker(bind=engine)
+
+    def _build_statements(self) -> None:
+        """Build the fixed-shape statements once, so calls only bind parameters."""
+        self._get_stmt_base = sql.select(
+            self._node_table.c.id,
+            self._node_table.c.text,
+            self._node_table.c.name,
+            self._node_table.c.label,
+            self._node_table.c.properties,
+        ).execution_options(yield_per=1000)
+
+        # executemany keeps the statement shape constant across batch sizes, the
+        # driver still sends the rows as pages of multi-row VALUES
+        stmt = insert(self._node_table)
+        self._upsert_nodes_stmt = stmt.on_conflict_do_update(
+            index_elements=["id"],
+            set_={
+                **{
+                    c: stmt.excluded[c]
+                    for c in ("name", "text", "label", "properties", "embedding")
+                },
+                "updated_at": sql.func.now(),
+            },
+        )
+        # create placeholder nodes for the endpoints that do not exist yet
+        self._upsert_endpoints_stmt = (
+            insert(self._node_table)
+            .from_select(
+                ["id"],
+                sql.select(
+                    sql.func.unnest(sql.bindparam("node_ids", type_=ARRAY(String)))
+                ),
+            )
+            .on_conflict_do_nothing(index_elements=["id"])
+        )
+        stmt = insert(self._relation_table)
+        self._upsert_relations_stmt = stmt.on_conflict_do_update(
+            index_elements=["source_id", "target_id", "label"],
+            set_={
+                "properties": stmt.excluded.properties,
+                "updated_at": sql.func.now(),
+            },
+        )
+        self._delete_relations_stmt = delete(self._relation_table).where(
+            self._relation_table.c.label
+            == sql.any_(sql.bindparam("relation_names", type_=ARRAY(String)))
+        )
 
     def init_schema(self) -> Tuple:
         """Initialize schema."""
@@ -113,63 +324,306 @@ class PostgresPropertyGraphStore(PropertyGraphStore):
 
         class NodeModel(BaseMixin, Base):
             __tablename__ = self._node_table_name
+            __table_args__ = (
+                Index(f"ix_{self._node_table_name}_name", "name"),
+                Index(f"ix_{self._node_table_name}_label", "label"),
+                Index(
+                    f"ix_{self._node_table_name}_properties",
+                    "properties",
+                    postgresql_using="gin",
+                ),
+            )
             id = Column(String(512), primary_key=True)
             text = Column(TEXT, nullable=True)
             name = Column(String(512), nullable=True)
             label = Column(String(512), nullable=False, default="node")
             properties = Column(JSONB(astext_type=Text()), default={})
-            embedding = Column(Vector(self._embedding_dim))
+            # halfvec stores fp16 components, halving table and index size
+            embedding = Column(
+                _HalfVec(self._embedding_dim)
+                if self._use_halfvec
+                else _Vector(self._embedding_dim)
+            )
 
         class RelationModel(BaseMixin, Base):
             __tablename__ = self._relation_table_name
+            __table_args__ = (
+                UniqueConstraint("source_id", "target_id", "label"),
+                Index(f"ix_{self._relation_table_name}_target_id", "target_id"),
+                Index(f"ix_{self._relation_table_name}_label", "label"),
+                Index(
+                    f"ix_{self._relation_table_name}_properties",
+                    "properties",
+                    postgresql_using="gin",
+                ),
+            )
             id = Column(Integer, primary_key=True)
             label = Column(String(512), nullable=False)
-            source_id = Column(String(512), ForeignKey(f"{self._node_table_name}.id"))
-            target_id = Column(String(512), ForeignKey(f"{self._node_table_name}.id"))
+            source_id = Column(
+                String(512),
+                ForeignKey(f"{self._node_table_name}.id", ondelete="CASCADE"),
+            )
+            target_id = Column(
+                String(512),
+                ForeignKey(f"{self._node_table_name}.id", ondelete="CASCADE"),
+            )
             properties = Column(JSONB(astext_type=Text()), default={})
 
-            source = relationship("NodeModel", foreign_keys=[source_id])
-            target = relationship("NodeModel", foreign_keys=[target_id])
-
         if self._drop_existing_table:
             Base.metadata.drop_all(self._engine)
-        Base.metadata.create_all(self._engine)
+        try:
+            Base.metadata.create_all(self._engine)
+            with self._engine.begin() as conn:
+                # create_all skips tables that exist, add the constraints and
+                # indexes introduced since then
+                upgraded = False
+                for table in Base.metadata.sorted_tables:
+                    upgraded |= upgrade_constraints(conn, table)
+                    upgraded |= upgrade_indexes(conn, table)
+                if upgraded:
+                    # refresh planner statistics so the new indexes are used
+                    tables = f"{self._node_table_name}, {self._relation_table_name}"
+                    conn.execute(sql.text(f"ANALYZE {tables}"))
+            self._create_embedding_index()
+        except exc.ProgrammingError as e:
+            if self._use_halfvec and _is_undefined_halfvec(e):
+                raise ValueError(
+                    "use_halfvec requires pgvector 0.7.0 or later. "
+                    "Please upgrade the extension or set use_halfvec=False."
+                ) from e
+            raise
         return NodeModel, RelationModel
 
+    def _choose_hnsw_params(self) -> Tuple[int, int, int]:
+        """Pick HNSW `(m, ef_construction, ef_search)` from the node table size."""
+        with self._engine.connect() as conn:
+            # planner estimate, -1 if the table was never analyzed
+            row_count = conn.execute(
+                sql.text(
+                    "SELECT reltuples::bigint FROM pg_class "
+                    "WHERE oid = to_regclass(:table_name)"
+                ),
+                {"table_name": self._node_table_name},
+            ).scalar()
+
+        row_count = row_count or 0
+        if row_count < 100_000:
+            m, ef_construction, ef_search = 16, 64, 40
+        elif row_count < 1_000_000:
+            m, ef_construction, ef_search = 24, 100, 100
+        else:
+            m, ef_construction, ef_search = 32, 128, 200
+        # explicitly passed parameters always win
+        return (
+            self._hnsw_m or m,
+            self._hnsw_ef_construction or ef_construction,
+            self._hnsw_ef_search or ef_search,
+        )
+
+    def _create_embedding_index(self, rebuild: bool = False) -> None:
+        """Create the index used by `vector_query`."""
+        ops = "halfvec_cosine_ops" if self._use_halfvec else "vector_cosine_ops"
+        if self._index_type == "hnsw":
+            self._hnsw_params = self._choose_hnsw_params()
+            m, ef_construction, _ = self._hnsw_params
+            using = (
+                f"hnsw (embedding {ops}) "
+                f"WITH (m = {m}, ef_construction = {ef_construction})"
+            )
+        elif self._index_type == "ivfflat":
+            # lists are computed from the rows present at build time, call
+            # `rebuild_index` once the table is populated
+            using = f"ivfflat (embedding {ops}) WITH (lists = {self._ivfflat_lists})"
+        else:
+            return
+
+        index_name = f"ix_{self._node_table_name}_embedding"
+        build_settings = {
+            name: value
+            for name, value in (
+                ("maintenance_work_mem", self._maintenance_work_mem),
+                (
+                    "max_parallel_maintenance_workers",
+                    self._max_parallel_maintenance_workers,
+                ),
+            )
+            if value is not None
+        }
+        with self._engine.connect() as conn:
+            # CONCURRENTLY keeps the table writable during the build but cannot
+            # run in a transaction, so the settings are reset once it is done
+            conn.execution_options(isolation_level="AUTOCOMMIT")
+            # IF NOT EXISTS only matches the name, so an index of another method or
+            # one left invalid by a failed build is replaced as well
+            existing = conn.execute(
+                sql.text(
+                    "SELECT am.amname, i.indisvalid FROM pg_index i "
+                    "JOIN pg_class c ON c.oid = i.indexrelid "
+                    "JOIN pg_am am ON am.oid = c.relam "
+                    "WHERE i.indexrelid = to_regclass(:index_name)"
+                ),
+                {"index_name": index_name},
+            ).first()
+            if existing is not None and (
+                existing.amname != self._index_type or not existing.indisvalid
+            ):
+                rebuild = True
+            # a rebuild is built next to the index it replaces, which keeps serving
+            # searches until it is swapped in
+            build_name = f"{index_name}_rebuild" if rebuild else index_name
+            for name, value in build_settings.items():
+                conn.execute(sql.select(sql.func.set_config(name, str(value), False)))
+            try:
+                if rebuild:
+                    # left behind by a rebuild that failed
+                    conn.execute(
+                        sql.text(f"DROP INDEX CONCURRENTLY IF EXISTS {build_name}")
+                    )
+                conn.execute(
+                    sql.text(
+                        f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {build_name} "
+                        f"ON {self._node_table_name} USING {using}"
+                    )
+                )
+                if rebuild:
+                    conn.execute(
+                        sql.text(f"DROP INDEX CONCURRENTLY IF EXISTS {index_name}")
+                    )
+                    conn.execute(
+                        sql.text(f"ALTER INDEX {build_name} RENAME TO {index_name}")
+                    )
+            finally:
+                for name in build_settings:
+                    conn.execute(sql.text(f"RESET {name}"))
+
+    def _search_settings(self, **kwargs: Any) -> Dict[str, Any]:
+        """Get the per-query settings of the embedding index."""
+        if self._index_type == "hnsw":
+            return {
+                "hnsw.ef_search": kwargs.get("hnsw_ef_search", self._hnsw_params[2])
+            }
+        if self._index_type == "ivfflat":
+            return {
+                "ivfflat.probes": kwargs.get("ivfflat_probes", self._ivfflat_probes)
+            }
+        return {}
+
+    def rebuild_index(self) -> None:
+        """Rebuild the embedding index with parameters tuned to the current size."""
+        self._create_embedding_index(rebuild=True)
+
+    def _get_stmt(
+        self,
+        properties: Optional[dict] = None,
+        ids: Optional[List[str]] = None,
+    ) -> sql.Select:
+        stmt = self._get_stmt_base
+        if properties:
+            stmt = stmt.where(self._node_table.c.properties.contains(properties))
+        if ids:
+            stmt = stmt.where(self._node_table.c.id == _any_of(ids))
+        return stmt
+
+    def _row_to_node(self, row: Row) -> LabelledNode:
+        if row.text and row.name is None:
+            return ChunkNode(
+                id=row.id,
+                text=row.text,
+                label=row.label,
+                properties=remove_empty_values(row.properties),
+            )
+        return EntityNode(
+            name=row.name,
+            label=row.label,
+            properties=remove_empty_values(row.properties),
+        )
+
     def get(
         self,
         properties: Optional[dict] = None,
         ids: Optional[List[str]] = None,
     ) -> List[LabelledNode]:
         """Get nodes."""
-        with Session(self._engine) as session:
-            query = session.query(self._node_model)
-            if properties:
-                for key, value in properties.items():
-                    query = query.filter(self._node_model.properties[key].astext == value)
-            if ids:
-                query = query.filter(self._node_model.id.in_(ids))
-
-            nodes = []
-            for n in query.all():
-                if n.text and n.name is None:
-                    nodes.append(
-                        ChunkNode(
-                            id=n.id,
-                            text=n.text,
-                            label=n.label,
-                            properties=remove_empty_values(n.properties),
-                        )
-                    )
-                else:
-                    nodes.append(
-                        EntityNode(
-                            name=n.name,
-                            label=n.label,
-                            properties=remove_empty_values(n.properties),
-                        )
-                    )
-            return nodes
+        with self._session() as session:
+            result = session.execute(self._get_stmt(properties, ids))
+            return [self._row_to_node(row) for row in result]
+
+    async def aget(
+        self,
+        properties: Optional[dict] = None,
+        ids: Optional[List[str]] = None,
+    ) -> List[LabelledNode]:
+        """Asynchronously get nodes."""
+        if self._async_db_connection_string is None:
+            return await asyncio.to_thread(self.get, properties, ids)
+
+        async with self._async_session() as session:
+            result = await session.stream(self._get_stmt(properties, ids))
+            return [self._row_to_node(row) async for row in result]
+
+    def _get_triplets_stmt(
+        self,
+        entity_names: Optional[List[str]] = None,
+        relation_names: Optional[List[str]] = None,
+        properties: Optional[dict] = None,
+        ids: Optional[List[str]] = None,
+    ) -> sql.Select:
+        source = self._node_table.alias("source")
+        target = self._node_table.alias("target")
+        stmt = (
+            sql.select(
+                source.c.name.label("source_name"),
+                source.c.label.label("source_label"),
+                strip_empty_values(source.c.properties).label("source_properties"),
+                self._relation_table.c.label.label("rel_label"),
+                strip_empty_values(self._relation_table.c.properties).label(
+                    "rel_properties"
+                ),
+                target.c.name.label("target_name"),
+                target.c.label.label("target_label"),
+                strip_empty_values(target.c.properties).label("target_properties"),
+            )
+            .select_from(self._relation_table)
+            .join(source, self._relation_table.c.source_id == source.c.id)
+            .join(target, self._relation_table.c.target_id == target.c.id)
+        )
+        if ids:
+            any_id = _any_of(ids)
+            stmt = stmt.where(
+                (self._relation_table.c.source_id == any_id)
+                | (self._relation_table.c.target_id == any_id)
+            )
+        if properties:
+            stmt = stmt.where(
+                self._relation_table.c.properties.contains(properties)
+                | source.c.properties.contains(properties)
+                | target.c.properties.contains(properties)
+            )
+        if entity_names:
+            any_name = _any_of(entity_names)
+            stmt = stmt.where((source.c.name == any_name) | (target.c.name == any_name))
+        if relation_names:
+            stmt = stmt.where(self._relation_table.c.label == _any_of(relation_names))
+        return stmt.execution_options(yield_per=1000)
+
+    def _row_to_triplet(self, row: Row) -> Triplet:
+        source = EntityNode(
+            name=row.source_name,
+            label=row.source_label,
+            properties=row.source_properties,
+        )
+        target = EntityNode(
+            name=row.target_name,
+            label=row.target_label,
+            properties=row.target_properties,
+        )
+        relation = Relation(
+            label=row.rel_label,
+            source_id=source.id,
+            target_id=target.id,
+            properties=row.rel_properties,
+        )
+        return [source, relation, target]
 
     def get_triplets(
         self,
@@ -183,59 +637,61 @@ class PostgresPropertyGraphStore(PropertyGraphStore):
         if not ids and not properties and not entity_names and not relation_names:
             return []
 
-        with Session(self._engine) as session:
-            query = session.query(self._relation_model).options(
-                joinedload(self._relation_model.source),
-                joinedload(self._relation_model.target),
+        stmt = self._get_triplets_stmt(entity_names, relation_names, properties, ids)
+        with self._session() as session:
+            return [self._row_to_triplet(row) for row in session.execute(stmt)]
+
+    async def aget_triplets(
+        self,
+        entity_names: Optional[List[str]] = None,
+        relation_names: Optional[List[str]] = None,
+        properties: Optional[dict] = None,
+        ids: Optional[List[str]] = None,
+    ) -> List[Triplet]:
+        """Asynchronously get triplets."""
+        # if nothing is passed, return empty list
+        if not ids and not properties and not entity_names and not relation_names:
+            return []
+        if self._async_db_connection_string is None:
+            return await asyncio.to_thread(
+                self.get_triplets, entity_names, relation_names, properties, ids
             )
-            if ids:
-                query = query.filter(
-                    self._relation_model.source_id.in_(ids)
-                    | self._relation_model.target_id.in_(ids)
-                )
-            if properties:
-                for key, value in properties.items():
-                    query = query.filter(
-                        (self._relation_model.properties[key].astext == value)
-                        | self._relation_model.source.has(
-                            self._node_model.properties[key].astext == value
-                        )
-                        | self._relation_model.target.has(
-                            self._node_model.properties[key].astext == value
-                        )
-                    )
-            if entity_names:
-                query = query.filter(
-                    self._relation_model.source.has(
-                        self._node_model.name.in_(entity_names)
-                    )
-                    | self._relation_model.target.has(
-                        self._node_model.name.in_(entity_names)
-                    )
-                )
-            if relation_names:
-                query = query.filter(self._relation_model.label.in_(relation_names))
-
-            triplets = []
-            for r in query.all():
-                source = EntityNode(
-                    name=r.source.name,
-                    label=r.source.label,
-                    properties=remove_empty_values(r.source.properties),
-                )
-                target = EntityNode(
-                    name=r.target.name,
-                    label=r.target.label,
-                    properties=remove_empty_values(r.target.properties),
-                )
-                relation = Relation(
-                    label=r.label,
-                    source_id=source.id,
-                    target_id=target.id,
-                    properties=remove_empty_values(r.properties),
-                )
-                triplets.append([source, relation, target])
-            return triplets
+
+        stmt = self._get_triplets_stmt(entity_names, relation_names, properties, ids)
+        async with self._async_session() as session:
+            result = await session.stream(stmt)
+            return [self._row_to_triplet(row) async for row in result]
+
+    def _rel_map_to_triplets(
+        self, rows: Sequence[Row], ignore_rels: Optional[List[str]] = None
+    ) -> List[Triplet]:
+        triplets = []
+        # a set lookup per row instead of a scan of the list
+        ignored = set(ignore_rels or ())
+        for row in rows:
+            if row.rel_label in ignored:
+                continue
+
+            source = EntityNode(
+                id=row.e1_id,
+                name=row.e1_name,
+                label=row.e1_label,
+                properties=row.e1_properties,
+            )
+            target = EntityNode(
+                id=row.e2_id,
+                name=row.e2_name,
+                label=row.e2_label,
+                properties=row.e2_properties,
+            )
+            relation = Relation(
+                label=row.rel_label,
+                source_id=source.id,
+                target_id=target.id,
+                properties=row.rel_properties,
+            )
+            triplets.append([source, relation, target])
+        return triplets
 
     def get_rel_map(
         self,
@@ -245,117 +701,175 @@ class PostgresPropertyGraphStore(PropertyGraphStore):
         ignore_rels: Optional[List[str]] = None,
     ) -> List[Triplet]:
         """Get depth-aware rel map."""
-        triplets = []
         ids = [node.id for node in graph_nodes]
 
         if not ids:
             return []
 
-        with Session(self._engine) as session:
-            result = session.execute(
-                sql.text(
-                    rel_depth_query.format(
-                        relation_table=self._relation_table_name,
-                        node_table=self._node_table_name,
-                    )
-                ),
+        with self._session() as session:
+            rows = session.execute(
+                self._rel_depth_stmt,
                 {
                     "ids": ids,
                     "depth": depth,
                     "limit": limit,
                 },
-            )
+            ).all()
+        return self._rel_map_to_triplets(rows, ignore_rels)
 
-            keys = result.keys()
-            raw_rels = [dict(zip(keys, row)) for row in result.fetchall()]
+    async def aget_rel_map(
+        self,
+        graph_nodes: List[LabelledNode],
+        depth: int = 2,
+        limit: int = 30,
+        ignore_rels: Optional[List[str]] = None,
+    ) -> List[Triplet]:
+        """Asynchronously get depth-aware rel map."""
+        if self._async_db_connection_string is None:
+            return await asyncio.to_thread(
+                self.get_rel_map, graph_nodes, depth, limit, ignore_rels
+            )
 
-            ignore_rels = ignore_rels or []
-            for row in raw_rels:
-                if row["rel_label"] in ignore_rels:
-                    continue
+        ids = [node.id for node in graph_nodes]
 
-                source = EntityNode(
-                    id=row["e1_id"],
-                    name=row["e1_name"],
-                    label=row["e1_label"],
-                    properties=row["e1_properties"],
-                )
-                target = EntityNode(
-                    id=row["e2_id"],
-                    name=row["e2_name"],
-                    label=row["e2_label"],
-                    properties=row["e2_properties"],
-                )
-                relation = Relation(
-                    label=row["rel_label"],
-                    source_id=source.id,
-                    target_id=target.id,
-                    properties=row["rel_properties"],
-                )
-                triplets.append([source, relation, target])
-        return triplets
+        if not ids:
+            return []
 
-    def upsert_nodes(self, nodes: List[LabelledNode]) -> None:
-        """Upsert nodes."""
-        entity_list: List[EntityNode] = []
-        chunk_list: List[ChunkNode] = []
-        other_list: List[LabelledNode] = []
+        async with self._async_session() as session:
+            result = await session.execute(
+                self._rel_depth_stmt,
+                {
+                    "ids": ids,
+                    "depth": depth,
+                    "limit": limit,
+                },
+            )
+            rows = result.all()
+        return self._rel_map_to_triplets(rows, ignore_rels)
 
+    def _node_rows(self, nodes: List[LabelledNode]) -> List[Dict[str, Any]]:
+        # keyed by id, a single INSERT ... ON CONFLICT cannot touch a row twice
+        rows: Dict[str, Dict[str, Any]] = {}
         for item in nodes:
             if isinstance(item, EntityNode):
-                entity_list.append(item)
+                rows[item.id] = {
+                    "id": item.id,
+                    "name": item.name,
+                    "text": None,
+                    "label": item.label,
+                    "properties": item.properties,
+                    "embedding": item.embedding,
+                }
             elif isinstance(item, ChunkNode):
-                chunk_list.append(item)
-            else:
-                other_list.append(item)
-
-        with Session(self._engine) as session:
-            # TODO: use upsert instead of get_or_create
-            for entity in entity_list:
-                entity_instance, _ = get_or_create(
-                    session, self._node_model, id=entity.id
-                )
-                entity_instance.name = entity.name
-                entity_instance.label = entity.label
-                entity_instance.properties = entity.properties
-                entity_instance.embedding = entity.embedding
-                session.add(entity_instance)
-
-            for chunk in chunk_list:
-                chunk_instance, _ = get_or_create(
-                    session, self._node_model, id=chunk.id
-                )
-                chunk_instance.text = chunk.text
-                chunk_instance.label = chunk.label
-                chunk_instance.properties = chunk.properties
-                chunk_instance.embedding = chunk.embedding
-                session.add(chunk_instance)
-            session.commit()
+                rows[item.id] = {
+                    "id": item.id,
+                    "name": None,
+                    "text": item.text,
+                    "label": item.label,
+                    "properties": item.properties,
+                    "embedding": item.embedding,
+                }
+
+        return list(rows.values())
+
+    def upsert_nodes(self, nodes: List[LabelledNode]) -> None:
+        """Upsert nodes."""
+        rows = self._node_rows(nodes)
+        if not rows:
+            return
+
+        with self._session() as session, session.begin():
+            session.execute(self._upsert_nodes_stmt, rows)
+
+    async def aupsert_nodes(self, nodes: List[LabelledNode]) -> None:
+        """Asynchronously upsert nodes."""
+        if self._async_db_connection_string is None:
+            await asyncio.to_thread(self.upsert_nodes, nodes)
+            return
+
+        rows = self._node_rows(nodes)
+        if not rows:
+            return
+
+        async with self._async_session() as session, session.begin():
+            await session.execute(self._upsert_nodes_stmt, rows)
+
+    def _relation_rows(
+        self, relations: List[Relation]
+    ) -> Tuple[List[str], List[Dict[str, Any]]]:
+        # keyed by the unique constraint for the same reason as in `_node_rows`
+        rows: Dict[Tuple[str, str, str], Dict[str, Any]] = {}
+        for r in relations:
+            rows[(r.source_id, r.target_id, r.label)] = {
+                "label": r.label,
+                "source_id": r.source_id,
+                "target_id": r.target_id,
+                "properties": r.properties,
+            }
+
+        node_ids = {r["source_id"] for r in rows.values()} | {
+            r["target_id"] for r in rows.values()
+        }
+        return list(node_ids), list(rows.values())
 
     def upsert_relations(self, relations: List[Relation]) -> None:
         """Upsert relations."""
-        with Session(self._engine) as session:
-            for r in relations:
-                get_or_create(
-                    session,
-                    self._node_model,
-                    id=r.source_id,
+        node_ids, rows = self._relation_rows(relations)
+        if not rows:
+            return
+
+        try:
+            with self._session() as session, session.begin():
+                session.execute(self._upsert_endpoints_stmt, {"node_ids": node_ids})
+                session.execute(self._upsert_relations_stmt, rows)
+        except exc.IntegrityError as e:
+            raise ValueError(
+                "An error occurred while upserting relations. "
+                "Please check if the source and target nodes are valid."
+            ) from e
+
+    async def aupsert_relations(self, relations: List[Relation]) -> None:
+        """Asynchronously upsert relations."""
+        if self._async_db_connection_string is None:
+            await asyncio.to_thread(self.upsert_relations, relations)
+            return
+
+        node_ids, rows = self._relation_rows(relations)
+        if not rows:
+            return
+
+        try:
+            async with self._async_session() as session, session.begin():
+                await session.execute(
+                    self._upsert_endpoints_stmt, {"node_ids": node_ids}
                 )
-                get_or_create(
-                    session,
-                    self._node_model,
-                    id=r.target_id,
-                )
-                relation_instance, _ = get_or_create(
-                    session,
-                    self._relation_model,
-                    label=r.label,
-                    source_id=r.source_id,
-                    target_id=r.target_id,
-                )
-                relation_instance.properties = r.properties
-                session.add(relation_instance)
-                session.commit()
+                await session.execute(self._upsert_relations_stmt, rows)
+        except exc.IntegrityError as e:
+            raise ValueError(
+                "An error occurred while upserting relations. "
+                "Please check if the source and target nodes are valid."
+            ) from e
+
+    def _delete_stmt(
+        self,
+        entity_names: Optional[List[str]] = None,
+        relation_names: Optional[List[str]] = None,
+        properties: Optional[dict] = None,
+        ids: Optional[List[str]] = None,
+    ) -> Tuple[Optional[sql.Delete], Dict[str, Any]]:
+        if ids or entity_names or properties:
+            # relations of the deleted nodes are removed by ON DELETE CASCADE
+            stmt = delete(self._node_table)
+            if ids:
+                stmt = stmt.where(self._node_table.c.id == _any_of(ids))
+            if entity_names:
+                stmt = stmt.where(self._node_table.c.name == _any_of(entity_names))
+            if properties:
+                stmt = stmt.where(self._node_table.c.properties.contains(properties))
+            return stmt, {}
+        if relation_names:
+            return self._delete_relations_stmt, {"relation_names": relation_names}
+        return None, {}
 
     def delete(
         self,
@@ -365,85 +879,108 @@ class PostgresPropertyGraphStore(PropertyGraphStore):
         ids: Optional[List[str]] = None,
     ) -> None:
         """Delete matching data."""
-        with Session(self._engine) as session:
-            # 1. Delete relations
-            relation_stmt = delete(self._relation_model)
-            if ids:
-                relation_stmt = relation_stmt.filter(
-                    self._relation_model.source_id.in_(ids)
-                    | self._relation_model.target_id.in_(ids)
-                )
-            if entity_names:
-                for entity_name in entity_names:
-                    relation_stmt = relation_stmt.filter(
-                        self._relation_model.source.has(name=entity_name)
-                        | self._relation_model.target.has(name=entity_name)
-                )
-            if relation_names:
-                relation_stmt = relation_stmt.filter(
-                    self._relation_model.label.in_(relation_names)
-                )
-            if properties:
-                for key, value in properties.items():
-                    relation_stmt = relation_stmt.filter(
-                        self._relation_model.source.has(
-                            self._node_model.properties[key].astext == value
-                        )
-                        | self._relation_model.target.has(
-                            self._node_model.properties[key].astext == value
-                        )
-                    )
-            session.execute(relation_stmt)
+        stmt, params = self._delete_stmt(entity_names, relation_names, properties, ids)
+        if stmt is None:
+            return
 
-            # 2. Delete nodes
-            entity_stmt = delete(self._node_model)
-            if ids:
-                entity_stmt = entity_stmt.filter(self._node_model.id.in_(ids))
-            if entity_names:
-                entity_stmt = entity_stmt.filter(
-                    self._node_model.name.in_(entity_names)
-                )
-            if properties:
-                for key, value in properties.items():
-                    entity_stmt = entity_stmt.filter(
-                        self._node_model.properties[key].astext == value
-                    )
-            session.execute(entity_stmt)
+        with self._session() as session:
+            session.execute(stmt, params)
             session.commit()
 
+    async def adelete(
+        self,
+        entity_names: Optional[List[str]] = None,
+        relation_names: Optional[List[str]] = None,
+        properties: Optional[dict] = None,
+        ids: Optional[List[str]] = None,
+    ) -> None:
+        """Asynchronously delete matching data."""
+        if self._async_db_connection_string is None:
+            await asyncio.to_thread(
+                self.delete, entity_names, relation_names, properties, ids
+            )
+            return
+
+        stmt, params = self._delete_stmt(entity_names, relation_names, properties, ids)
+        if stmt is None:
+            return
+
+        async with self._async_session() as session:
+            await session.execute(stmt, params)
+            await session.commit()
+
     def structured_query(
         self, query: str, param_map: Optional[Dict[str, Any]] = None
     ) -> Any:
         """Query the graph store with statement and parameters."""
         raise NotImplementedError("PostgreSQL does not support cypher queries.")
 
+    def _vector_query_stmt(self, query: VectorStoreQuery) -> sql.Select:
+        distance = self._node_table.c.embedding.cosine_distance(query.query_embedding)
+        # ordering on the distance column still lets the planner use the index, and
+        # the query embedding is sent once instead of once per reference
+        top_k = (
+            sql.select(
+                self._node_table.c.name,
+                self._node_table.c.label,
+                self._node_table.c.properties,
+                distance.label("distance"),
+            )
+            .where(self._node_table.c.name.is_not(None))
+            .order_by(sql.literal_column("distance"))
+            .limit(query.similarity_top_k)
+            .subquery("top_k")
+        )
+        return sql.select(
+            top_k.c.name,
+            top_k.c.label,
+            top_k.c.properties,
+            (1 - top_k.c.distance).label("score"),
+        ).order_by(top_k.c.distance)
+
+    def _search_settings_stmts(self, **kwargs: Any) -> List[sql.Select]:
+        # set_config(..., true) is the bindable form of SET LOCAL
+        return [
+            sql.select(sql.func.set_config(name, str(value), True))
+            for name, value in self._search_settings(**kwargs).items()
+        ]
+
+    def _vector_query_result(
+        self, rows: Sequence[Row]
+    ) -> Tuple[List[LabelledNode], List[float]]:
+        nodes = []
+        scores = []
+        for row in rows:
+            nodes.append(
+                EntityNode(
+                    name=row.name,
+                    label=row.label,
+                    properties=remove_empty_values(row.properties),
+                )
+            )
+            scores.append(row.score)
+        return nodes, scores
+
     def vector_query(
         self, query: VectorStoreQuery, **kwargs: Any
     ) -> Tuple[List[LabelledNode], List[float]]:
         """Query the graph store with a vector store query."""
-        with Session(self._engine) as session:
-            result = (
-                session.query(
-                    self._node_model,
-                    self._node_model.embedding.cosine_distance(
-                        query.query_embedding
-                    ).label("embedding_distance"),
-                )
-                .filter(self._node_model.name.is_not(None))
-                .order_by(sql.asc("embedding_distance"))
-                .limit(query.similarity_top_k)
-                .all()
-            )
+        with self._session() as session, session.begin():
+            for settings_stmt in self._search_settings_stmts(**kwargs):
+                session.execute(settings_stmt)
+            rows = session.execute(self._vector_query_stmt(query)).all()
+        return self._vector_query_result(rows)
 
-            nodes = []
-            scores = []
-            for node, score in result:
-                nodes.append(
-                    EntityNode(
-                        name=node.name,
-                        label=node.label,
-                        properties=remove_empty_values(node.properties),
-                    )
-                )
-                scores.append(score)
-            return nodes, scores
+    async def avector_query(
+        self, query: VectorStoreQuery, **kwargs: Any
+    ) -> Tuple[List[LabelledNode], List[float]]:
+        """Asynchronously query the graph store with a vector store query."""
+        if self._async_db_connection_string is None:
+            return await asyncio.to_thread(self.vector_query, query, **kwargs)
+
+        async with self._async_session() as session, session.begin():
+            for settings_stmt in self._search_settings_stmts(**kwargs):
+                await session.execute(settings_stmt)
+            result = await session.execute(self._vector_query_stmt(query))
+            rows = result.all()
+        return self._vector_query_result(rows)
@@ -1,33 +1,277 @@
+from functools import lru_cache
+from operator import itemgetter
+from typing import Any, Dict, List, Optional, Tuple
+
 from sqlalchemy.orm import Session
-from sqlalchemy import Engine, exc, sql
+from sqlalchemy import (
+    URL,
+    Connection,
+    Engine,
+    Table,
+    Text,
+    UniqueConstraint,
+    exc,
+    inspect,
+    sql,
+)
+from sqlalchemy.dialects.postgresql import ARRAY, JSONB, insert
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlalchemy.schema import AddConstraint
+from sqlalchemy.sql.dml import ReturningInsert
+from sqlalchemy.sql.expression import ColumnElement, ScalarSelect, Select
+
+
+_DB_UNAVAILABLE = (
+    "An error occurred while checking the database availability. "
+    "Please check if the connection string is correct and pgvector is installed."
+)
+# more specific messages for the SQLSTATEs the driver reports, where it does
+_PGCODE_MESSAGES = {
+    "28000": "Authentication failed. Please check the user in the connection string.",
+    "28P01": "Authentication failed. Please check the password in the connection "
+    "string.",
+    "3D000": "The database does not exist. Please check the connection string.",
+}
+_PROBE = sql.text(
+    """SELECT EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'vector');"""
+)
+# databases already found to have pgvector by `check_db_availability`; keyed by
+# URL rather than engine, as every store creates an engine of its own
+_db_availability: Dict[URL, Dict[str, bool]] = {}
+
+
+def _availability_error(e: Exception) -> ValueError:
+    pgcode = getattr(getattr(e, "orig", None), "pgcode", None)
+    return ValueError(_PGCODE_MESSAGES.get(str(pgcode), _DB_UNAVAILABLE))
+
+
+def _remembered_availability(url: URL) -> Optional[Dict[str, bool]]:
+    return _db_availability.get(url)
+
+
+def _remember_availability(url: URL, vector: bool) -> Dict[str, bool]:
+    availability = {"vector": vector}
+    # the extension may still be created, so only its presence is remembered
+    if vector:
+        _db_availability[url] = availability
+    return availability
+
+
+def _checked_availability(
+    availability: Dict[str, bool], check_vector: bool
+) -> Dict[str, bool]:
+    if check_vector and not availability["vector"]:
+        raise ValueError(_DB_UNAVAILABLE)
+    return availability
+
+
+def check_db_availability(
+    engine: Engine, check_vector: bool = False
+) -> Dict[str, bool]:
+    availability = _remembered_availability(engine.url)
+    if availability is None:
+        try:
+            with engine.connect() as conn:
+                vector: bool = conn.execute(_PROBE).scalar_one()
+        except exc.DBAPIError as e:
+            raise _availability_error(e) from e
+        availability = _remember_availability(engine.url, vector)
+
+    return _checked_availability(availability, check_vector)
+
+
+async def acheck_db_availability(
+    engine: AsyncEngine, check_vector: bool = False
+) -> Dict[str, bool]:
+    """
+    Asynchronously check the database availability, like `check_db_availability`.
+
+    Stores on different databases can be probed concurrently, e.g. with
+    `asyncio.gather`.
+    """
+    availability = _remembered_availability(engine.url)
+    if availability is None:
+        try:
+            async with engine.connect() as conn:
+                vector: bool = (await conn.execute(_PROBE)).scalar_one()
+        # asyncpg raises OSError as is when the server cannot be reached
+        except (exc.DBAPIError, OSError) as e:
+            raise _availability_error(e) from e
+        availability = _remember_availability(engine.url, vector)
+
+    return _checked_availability(availability, check_vector)
+
+
+def upgrade_constraints(conn: Connection, table: Table) -> bool:
+    """
+    Bring the constraints of an existing table in line with `table`.
+
+    `create_all` leaves tables created by an earlier version as they are, while
+    the upserts rely on the unique constraints for their ON CONFLICT clause and
+    deletes on the ON DELETE action of the foreign keys. Missing unique
+    constraints are added, foreign keys with another ON DELETE are recreated.
+
+    Parameters
+    ----------
+    conn (Connection): The connection to run in, inside a transaction.
+    table (Table): The table as its model defines it.
+
+    Returns
+    -------
+    bool: Whether any constraint was added or recreated.
+
+    """
+    upgraded = False
+    existing = {
+        frozenset(c["column_names"])
+        for c in inspect(conn).get_unique_constraints(table.name)
+    }
+    for constraint in table.constraints:
+        if not isinstance(constraint, UniqueConstraint):
+            continue
+        columns = constraint.columns.keys()
+        if frozenset(columns) in existing:
+            continue
+        try:
+            conn.execute(AddConstraint(constraint))
+        except exc.IntegrityError as e:
+            raise ValueError(
+                f"The table {table.name} has duplicate rows for the columns "
+                f"{', '.join(columns)}, so their unique constraint cannot be added. "
+                "Please remove the duplicates or recreate the table."
+            ) from e
+        upgraded = True
+
+    existing_ondelete = {
+        tuple(fk["constrained_columns"]): (fk["name"], fk["options"].get("ondelete"))
+        for fk in inspect(conn).get_foreign_keys(table.name)
+    }
+    for fk in table.foreign_key_constraints:
+        key = tuple(fk.columns.keys())
+        if key not in existing_ondelete:
+            continue
+        name, ondelete = existing_ondelete[key]
+        if (ondelete or "").upper() == (fk.ondelete or "").upper():
+            continue
+        # both in the transaction of `conn`, so the rows stay constrained
+        conn.execute(
+            sql.text(
+                f"ALTER TABLE {table.name} DROP CONSTRAINT "
+                f"{conn.dialect.identifier_preparer.quote(str(name))}"
+            )
+        )
+        conn.execute(AddConstraint(fk))
+        upgraded = True
+    return upgraded
+
+
+def upgrade_indexes(conn: Connection, table: Table) -> bool:
+    """
+    Create the indexes of `table` that an existing table does not have yet.
+
+    Like the constraints, indexes introduced since a table was created by an
+    earlier version are left out by `create_all`, so lookups on them would scan
+    the table.
+
+    Parameters
+    ----------
+    conn (Connection): The connection to run in, inside a transaction.
+    table (Table): The table as its model defines it.
+
+    Returns
+    -------
+    bool: Whether any index was created.
+
+    """
+    existing = {index["name"] for index in inspect(conn).get_indexes(table.name)}
+    missing = [index for index in table.indexes if index.name not in existing]
+    for index in missing:
+        index.create(conn)
+    return bool(missing)
 
 
-def check_db_availability(engine: Engine, check_vector: bool = False) -> None:
-    try:
-        with engine.connect() as conn:
-            if check_vector:
-                conn.execute(sql.text("""SELECT '[1]'::vector;"""))
-            else:
-                conn.execute(sql.text("""SELECT 1;"""))
-    except exc.DatabaseError as e:
-        raise ValueError(
-            "An error occurred while checking the database availability. "
-            "Please check if the connection string is correct and pgvector is installed."
-        ) from e
+def get_or_create_ids(
+    session: Session,
+    model: Any,
+    conflict_cols: List[str],
+    rows: List[Dict[str, Any]],
+) -> Tuple[List[Any], List[bool]]:
+    """
+    Get or create many rows of a model in two statements, returning ids.
 
+    The rows are inserted with ON CONFLICT DO NOTHING and the ones that already
+    existed are selected afterwards, so existing rows are only read and never
+    locked. Only the primary key and conflict columns are returned, so no ORM
+    instance is loaded for callers that go on to reference the rows by id.
 
-def get_or_create(session: Session, model, **kwargs):
-    instance = session.query(model).filter_by(**kwargs).first()
-    if instance:
-        return instance, False
-    else:
-        instance = model(**kwargs)
-        session.add(instance)
-        session.commit()
-        return instance, True
+    Parameters
+    ----------
+    session (Session): The session to run in, it is not committed.
+    model: The ORM model to get or create rows of.
+    conflict_cols (List[str]): The columns of a unique constraint of the model.
+    rows (List[Dict[str, Any]]): The column values of each row.
 
+    Returns
+    -------
+    Tuple[List[Any], List[bool]]: The ids in the order of `rows`, and whether
+    each of them was created.
 
-def remove_empty_values(input_dict):
+    """
+    if not rows:
+        return [], []
+
+    def key_of(values: Dict[str, Any]) -> tuple:
+        return tuple(values[c] for c in conflict_cols)
+
+    # new rows are inserted in key order, so that transactions inserting the same
+    # keys wait for each other instead of deadlocking
+    unique_rows = sorted({key_of(row): row for row in rows}.values(), key=key_of)
+    insert_stmt, select_stmt = _get_or_create_ids_stmts(
+        model.__table__, tuple(conflict_cols), tuple(unique_rows[0])
+    )
+    # executemany, the driver still sends the rows as pages of multi-row VALUES
+    ids = {tuple(row[1:]): row[0] for row in session.execute(insert_stmt, unique_rows)}
+    created = set(ids)
+
+    missing = [key_of(row) for row in unique_rows if key_of(row) not in created]
+    if missing:
+        keys = {c: [key[i] for key in missing] for i, c in enumerate(conflict_cols)}
+        ids.update(
+            (tuple(row[1:]), row[0]) for row in session.execute(select_stmt, keys)
+        )
+
+    return (
+        [ids[key_of(row)] for row in rows],
+        [key_of(row) in created for row in rows],
+    )
+
+
+@lru_cache(maxsize=128)
+def _get_or_create_ids_stmts(
+    table: Table, conflict_cols: Tuple[str, ...], cols: Tuple[str, ...]
+) -> Tuple[ReturningInsert, Select]:
+    """Build the statements of `get_or_create_ids` once per table and columns."""
+    # neither statement changes with the number of rows, so both are compiled once
+    columns = [table.c[c] for c in conflict_cols]
+    insert_stmt = (
+        insert(table)
+        .values({c: sql.bindparam(c) for c in cols})
+        .on_conflict_do_nothing(index_elements=list(conflict_cols))
+        .returning(table.c.id, *columns)
+    )
+    # the keys are bound as one array per column and joined as rows
+    keys = (
+        sql.func.unnest(*(sql.bindparam(c.name, type_=ARRAY(c.type)) for c in columns))
+        .table_valued(*conflict_cols)
+        .render_derived()
+    )
+    select_stmt = sql.select(table.c.id, *columns).select_from(
+        table.join(keys, sql.and_(*(c == keys.c[c.name] for c in columns)))
+    )
+    return insert_stmt, select_stmt
+
+
+def remove_empty_values(input_dict: Dict[str, Any]) -> Dict[str, Any]:
     """
     Remove entries with empty values from the dictionary.
 
@@ -37,8 +281,44 @@ def remove_empty_values(input_dict):
 
     Returns
     -------
-    dict: A new dictionary with all empty values removed.
+    dict: A dictionary with all empty values removed, `input_dict` itself if it
+    has none.
+
+    """
+    # Most dictionaries have no empty values, so skip the copy for them
+    if all(input_dict.values()):
+        return input_dict
+    return dict(filter(itemgetter(1), input_dict.items()))
+
+
+def strip_empty_values(properties: ColumnElement) -> ScalarSelect:
+    """
+    Build the SQL counterpart of `remove_empty_values` for a JSONB column.
+
+    Parameters
+    ----------
+    properties (ColumnElement): The JSONB column to remove empty values from.
+
+    Returns
+    -------
+    ColumnElement: A scalar subquery evaluating to the object without empty values.
 
     """
-    # Create a new dictionary excluding empty values
-    return {key: value for key, value in input_dict.items() if value}
+    # the JSON values Python considers falsy once decoded
+    empty_values = [
+        sql.cast(sql.literal(value, Text), JSONB)
+        for value in ("null", '""', "0", "false", "[]", "{}")
+    ]
+    entries = sql.func.jsonb_each(properties).table_valued(
+        sql.column("key", Text), sql.column("value", JSONB)
+    )
+    return (
+        sql.select(
+            sql.func.coalesce(
+                sql.func.jsonb_object_agg(entries.c.key, entries.c.value),
+                sql.cast(sql.literal("{}", Text), JSONB),
+            )
+        )
+        .where(entries.c.value.not_in(empty_values))
+        .scalar_subquery()
+    )
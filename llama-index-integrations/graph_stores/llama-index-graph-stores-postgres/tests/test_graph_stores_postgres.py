@@ -1,7 +1,180 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from unittest import TestCase, SkipTest
+
+import pytest
+from sqlalchemy import create_engine, make_url, sql
+
 from llama_index.core.graph_stores.types import GraphStore
 from llama_index.graph_stores.postgres import PostgresGraphStore
+from llama_index.graph_stores.postgres.utils import check_db_availability
 
 
 def test_postgres_graph_store():
     names_of_bases = [b.__name__ for b in PostgresGraphStore.__bases__]
     assert GraphStore.__name__ in names_of_bases
+
+
+def test_upgrade_previous_schema():
+    # the tables as created by versions without the unique constraints
+    try:
+        g = PostgresGraphStore(
+            db_connection_string=os.environ.get("POSTGRES_TEST_CONNECTION_STRING"),
+            entity_table_name="test_old_entities",
+            relation_table_name="test_old_entity_relations",
+        )
+    except Exception:
+        raise SkipTest("PostgreSQL database is not available")
+    with g.get_client.begin() as conn:
+        conn.execute(
+            sql.text(
+                "DROP TABLE test_old_entity_relations, test_old_entities;"
+                "CREATE TABLE test_old_entities ("
+                " id SERIAL PRIMARY KEY, name VARCHAR(512) NOT NULL,"
+                " created_at TIMESTAMP NOT NULL DEFAULT now(),"
+                " updated_at TIMESTAMP NOT NULL DEFAULT now());"
+                "CREATE TABLE test_old_entity_relations ("
+                " id SERIAL PRIMARY KEY, description TEXT NOT NULL,"
+                " subject_id INTEGER REFERENCES test_old_entities (id),"
+                " object_id INTEGER REFERENCES test_old_entities (id),"
+                " created_at TIMESTAMP NOT NULL DEFAULT now(),"
+                " updated_at TIMESTAMP NOT NULL DEFAULT now());"
+            )
+        )
+
+    try:
+        g.init_schema()
+        g.upsert_triplets([("Alice", "knows", "Bob")])
+        g.upsert_triplets([("Alice", "knows", "Bob")])
+        assert g.get("Alice") == [["knows", "Bob"]]
+    finally:
+        with g.get_client.begin() as conn:
+            conn.execute(
+                sql.text("DROP TABLE test_old_entity_relations, test_old_entities")
+            )
+
+
+def test_availability_rechecked_until_vector_exists():
+    try:
+        url = make_url(os.environ.get("POSTGRES_TEST_CONNECTION_STRING"))
+        engine = create_engine(url, isolation_level="AUTOCOMMIT")
+        with engine.connect() as conn:
+            conn.execute(sql.text("DROP DATABASE IF EXISTS test_availability"))
+            conn.execute(sql.text("CREATE DATABASE test_availability"))
+    except Exception:
+        raise SkipTest("PostgreSQL database is not available")
+
+    db_engine = create_engine(url.set(database="test_availability"))
+    try:
+        with pytest.raises(ValueError):
+            check_db_availability(db_engine, check_vector=True)
+        with db_engine.begin() as conn:
+            conn.execute(sql.text("CREATE EXTENSION vector"))
+        assert check_db_availability(db_engine, check_vector=True) == {"vector": True}
+    finally:
+        db_engine.dispose()
+        with engine.connect() as conn:
+            conn.execute(sql.text("DROP DATABASE test_availability"))
+
+
+class TestPostgresGraphStore(TestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        try:
+            cls.g = PostgresGraphStore(
+                db_connection_string=os.environ.get("POSTGRES_TEST_CONNECTION_STRING"),
+                entity_table_name="test_entities",
+                relation_table_name="test_entity_relations",
+            )
+        except Exception:
+            raise SkipTest("PostgreSQL database is not available")
+
+    def setUp(self) -> None:
+        with self.g.get_client.begin() as conn:
+            conn.execute(
+                sql.text(
+                    "TRUNCATE TABLE test_entity_relations, test_entities "
+                    "RESTART IDENTITY"
+                )
+            )
+
+        self.g.upsert_triplets(
+            [
+                ("Alice", "knows", "Bob"),
+                ("Bob", "knows", "Charlie"),
+                ("Alice", "likes", "Charlie"),
+            ]
+        )
+
+    def test_upsert_triplets(self):
+        self.g.upsert_triplets([("Alice", "knows", "Bob")])
+        assert sorted(self.g.get("Alice")) == [["knows", "Bob"], ["likes", "Charlie"]]
+        assert self.g.get("Charlie") == []
+
+    def test_get_rel_map(self):
+        rel_map = self.g.get_rel_map(["Alice"], depth=2)
+        assert sorted(rel_map["Alice"]) == [
+            ["Alice", "knows", "Bob"],
+            ["Alice", "likes", "Charlie"],
+            ["Bob", "knows", "Charlie"],
+        ]
+
+    def test_init_schema_analyzes_only_new_indexes(self):
+        stmt = sql.text(
+            "SELECT analyze_count FROM pg_stat_user_tables "
+            "WHERE relname = 'test_entities'"
+        )
+        analyze_count = self.g.query(stmt)
+        self.g.init_schema()
+        assert self.g.query(stmt) == analyze_count
+
+    def test_query_stream(self):
+        stmt = sql.text("SELECT name FROM test_entities ORDER BY name")
+        rows = self.g.query(stmt, stream=True)
+        assert not isinstance(rows, list)
+        assert [name for name, in rows] == ["Alice", "Bob", "Charlie"]
+
+    def test_query_text(self):
+        rows = self.g.query("SELECT name FROM test_entities ORDER BY name", stream=True)
+        assert [name for name, in rows] == ["Alice", "Bob", "Charlie"]
+
+    def test_delete_keeps_referenced_entities(self):
+        self.g.delete("Alice", "likes", "Charlie")
+        assert self.g.get("Alice") == [["knows", "Bob"]]
+        # Charlie is still the object of Bob's relation
+        self.g.upsert_triplets([("Charlie", "knows", "Bob")])
+        self.g.delete("Alice", "knows", "Bob")
+        stmt = sql.text("SELECT name FROM test_entities ORDER BY name")
+        assert [name for name, in self.g.query(stmt)] == ["Bob", "Charlie"]
+
+    def test_bulk_session_is_local_to_thread(self):
+        with pytest.raises(RuntimeError):
+            with self.g.bulk_session():
+                self.g.upsert_triplet("Alice", "knows", "Dave")
+                # written from another thread while the block is open
+                with ThreadPoolExecutor(1) as executor:
+                    executor.submit(
+                        self.g.upsert_triplet, "Erin", "knows", "Frank"
+                    ).result()
+                raise RuntimeError
+        assert self.g.get("Erin") == [["knows", "Frank"]]
+        assert ["knows", "Dave"] not in self.g.get("Alice")
+
+    def test_bulk_sessions_do_not_lock_existing_rows(self):
+        barrier = threading.Barrier(2, timeout=10)
+
+        def upsert(triplet):
+            with self.g.bulk_session():
+                self.g.upsert_triplets([triplet])
+                # both blocks are open at once, over the same existing entities
+                barrier.wait()
+
+        with ThreadPoolExecutor(2) as executor:
+            futures = [
+                executor.submit(upsert, triplet)
+                for triplet in [("Alice", "knows", "Bob"), ("Bob", "knows", "Alice")]
+            ]
+            for future in futures:
+                future.result()
+        assert sorted(self.g.get("Bob")) == [["knows", "Alice"], ["knows", "Charlie"]]
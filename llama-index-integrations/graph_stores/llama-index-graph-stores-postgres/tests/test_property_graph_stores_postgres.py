@@ -1,37 +1,314 @@
+import asyncio
 import os
 from unittest import TestCase, SkipTest
 
+import numpy as np
+import pytest
+from sqlalchemy import create_engine, exc, make_url, sql
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import NullPool
+
 from llama_index.core.graph_stores.types import (
     EntityNode,
     Relation,
+    VectorStoreQuery,
 )
 
 from llama_index.graph_stores.postgres import PostgresPropertyGraphStore
+from llama_index.graph_stores.postgres.utils import acheck_db_availability
 
 
-def get_store():
+def get_store(**kwargs):
     return PostgresPropertyGraphStore(
         db_connection_string=os.environ.get("POSTGRES_TEST_CONNECTION_STRING"),
-        drop_existing_table=True,
         relation_table_name="test_relations",
         node_table_name="test_nodes",
+        **{"drop_existing_table": True, **kwargs},
+    )
+
+
+def get_embedding_index(g):
+    with g._engine.connect() as conn:
+        return conn.execute(
+            sql.text(
+                "SELECT am.amname, i.indisvalid FROM pg_index i "
+                "JOIN pg_class c ON c.oid = i.indexrelid "
+                "JOIN pg_am am ON am.oid = c.relam "
+                "WHERE c.relname LIKE 'ix_test_nodes_embedding%'"
+            )
+        ).all()
+
+
+def test_embedding_dim_beyond_index_limit():
+    # rejected before connecting, so no database is needed
+    with pytest.raises(ValueError, match="use_halfvec"):
+        PostgresPropertyGraphStore(
+            db_connection_string="postgresql+psycopg2://localhost/unused",
+            embedding_dim=3072,
+            index_type="hnsw",
+        )
+
+
+def test_embedding_dim_beyond_index_limit_without_index():
+    try:
+        g = get_store(embedding_dim=3072)
+    except Exception:
+        pytest.skip("PostgreSQL database is not available")
+
+    g.upsert_nodes(
+        [
+            EntityNode(name="e1", embedding=np.full(3072, 0.1).tolist()),
+            EntityNode(name="e2", embedding=np.linspace(0, 1, 3072).tolist()),
+        ]
+    )
+    nodes, scores = g.vector_query(
+        VectorStoreQuery(
+            query_embedding=np.full(3072, 0.1).tolist(), similarity_top_k=1
+        )
+    )
+    assert [n.name for n in nodes] == ["e1"]
+    assert scores[0] == pytest.approx(1.0)
+
+
+def test_null_pool():
+    if not os.environ.get("POSTGRES_TEST_CONNECTION_STRING"):
+        pytest.skip("PostgreSQL database is not available")
+    try:
+        g = get_store(create_engine_kwargs={"poolclass": NullPool})
+    except ValueError:
+        pytest.skip("PostgreSQL database is not available")
+
+    assert isinstance(g._engine.pool, NullPool)
+    g.upsert_nodes([EntityNode(name="e1")])
+    assert [n.name for n in g.get(properties={})] == ["e1"]
+
+
+def test_rebuild_index():
+    try:
+        g = get_store(index_type="hnsw", maintenance_work_mem="128MB")
+    except Exception:
+        pytest.skip("PostgreSQL database is not available")
+
+    g.rebuild_index()
+    with g._engine.connect() as conn:
+        indexes = conn.execute(
+            sql.text(
+                "SELECT indexname FROM pg_indexes "
+                "WHERE tablename = 'test_nodes' AND indexname LIKE '%embedding%'"
+            )
+        ).scalars()
+        assert list(indexes) == ["ix_test_nodes_embedding"]
+        # the build settings do not outlive the build
+        assert conn.execute(sql.text("SHOW maintenance_work_mem")).scalar() != "128MB"
+
+
+def test_replace_index_of_other_type():
+    try:
+        g = get_store(index_type="hnsw")
+    except Exception:
+        pytest.skip("PostgreSQL database is not available")
+
+    g = get_store(index_type="ivfflat", drop_existing_table=False)
+    assert get_embedding_index(g) == [("ivfflat", True)]
+
+
+def test_replace_invalid_index():
+    try:
+        g = get_store()
+    except Exception:
+        pytest.skip("PostgreSQL database is not available")
+    g.upsert_nodes([EntityNode(name="e1"), EntityNode(name="e2")])
+    # a CREATE INDEX CONCURRENTLY that fails leaves its index behind as invalid
+    with g._engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        with pytest.raises(exc.IntegrityError):
+            conn.execute(
+                sql.text(
+                    "CREATE UNIQUE INDEX CONCURRENTLY ix_test_nodes_embedding "
+                    "ON test_nodes (label)"
+                )
+            )
+    assert get_embedding_index(g) == [("btree", False)]
+
+    g = get_store(index_type="hnsw", drop_existing_table=False)
+    assert get_embedding_index(g) == [("hnsw", True)]
+
+
+# the tables as created by versions without the unique and ON DELETE constraints
+PREVIOUS_SCHEMA = """
+DROP TABLE IF EXISTS test_old_relations, test_old_nodes;
+CREATE TABLE test_old_nodes (
+    id VARCHAR(512) PRIMARY KEY,
+    text TEXT,
+    name VARCHAR(512),
+    label VARCHAR(512) NOT NULL,
+    properties JSONB,
+    embedding VECTOR(1024),
+    created_at TIMESTAMP NOT NULL DEFAULT now(),
+    updated_at TIMESTAMP NOT NULL DEFAULT now()
+);
+CREATE TABLE test_old_relations (
+    id SERIAL PRIMARY KEY,
+    label VARCHAR(512) NOT NULL,
+    source_id VARCHAR(512) REFERENCES test_old_nodes (id),
+    target_id VARCHAR(512) REFERENCES test_old_nodes (id),
+    properties JSONB,
+    created_at TIMESTAMP NOT NULL DEFAULT now(),
+    updated_at TIMESTAMP NOT NULL DEFAULT now()
+);
+"""
+
+
+@pytest.fixture()
+def previous_schema():
+    try:
+        engine = create_engine(os.environ.get("POSTGRES_TEST_CONNECTION_STRING"))
+        with engine.begin() as conn:
+            conn.execute(sql.text(PREVIOUS_SCHEMA))
+    except Exception:
+        pytest.skip("PostgreSQL database is not available")
+    yield engine
+    with engine.begin() as conn:
+        conn.execute(sql.text("DROP TABLE test_old_relations, test_old_nodes"))
+    engine.dispose()
+
+
+def get_previous_store():
+    return PostgresPropertyGraphStore(
+        db_connection_string=os.environ.get("POSTGRES_TEST_CONNECTION_STRING"),
+        relation_table_name="test_old_relations",
+        node_table_name="test_old_nodes",
     )
 
 
+def test_upgrade_previous_schema(previous_schema):
+    g = get_previous_store()
+    with previous_schema.connect() as conn:
+        indexes = conn.execute(
+            sql.text(
+                "SELECT indexname FROM pg_indexes "
+                "WHERE tablename IN ('test_old_nodes', 'test_old_relations') "
+                "AND indexname LIKE 'ix_%' ORDER BY indexname"
+            )
+        ).scalars()
+        assert list(indexes) == [
+            "ix_test_old_nodes_label",
+            "ix_test_old_nodes_name",
+            "ix_test_old_nodes_properties",
+            "ix_test_old_relations_label",
+            "ix_test_old_relations_properties",
+            "ix_test_old_relations_target_id",
+        ]
+
+    e1 = EntityNode(name="e1")
+    e2 = EntityNode(name="e2")
+    g.upsert_nodes([e1, e2])
+    r = Relation(label="r", source_id=e1.id, target_id=e2.id)
+    g.upsert_relations([r])
+    r.properties = {"p1": "v1"}
+    g.upsert_relations([r])
+    assert g.get_triplets(entity_names=["e1"])[0][1].properties == {"p1": "v1"}
+    g.delete(entity_names=["e1"])
+    assert g.get_triplets(entity_names=["e2"]) == []
+
+
+def test_upgrade_previous_schema_with_duplicates(previous_schema):
+    with previous_schema.begin() as conn:
+        conn.execute(
+            sql.text(
+                "INSERT INTO test_old_nodes (id, label) VALUES ('a', 'n');"
+                "INSERT INTO test_old_relations (label, source_id, target_id) "
+                "VALUES ('r', 'a', 'a'), ('r', 'a', 'a');"
+            )
+        )
+    with pytest.raises(ValueError, match="duplicate rows"):
+        get_previous_store()
+
+
+def test_async_engine():
+    try:
+        async_url = make_url(os.environ.get("POSTGRES_TEST_CONNECTION_STRING")).set(
+            drivername="postgresql+asyncpg"
+        )
+        g = get_store(
+            async_db_connection_string=async_url.render_as_string(hide_password=False),
+            # only understood by psycopg2, it must not reach the async engine
+            create_engine_kwargs={"executemany_mode": "values_plus_batch"},
+        )
+    except Exception:
+        pytest.skip("PostgreSQL database is not available")
+
+    e1 = EntityNode(name="e1", embedding=np.full(1024, 0.1).tolist())
+    e2 = EntityNode(name="e2")
+    r = Relation(label="r", source_id=e1.id, target_id=e2.id)
+
+    async def add():
+        await g.aupsert_nodes([e1, e2])
+        await g.aupsert_relations([r])
+        return await g.aget_triplets(entity_names=["e1"])
+
+    async def query_and_delete():
+        nodes, _ = await g.avector_query(
+            VectorStoreQuery(
+                query_embedding=np.full(1024, 0.1).tolist(), similarity_top_k=1
+            )
+        )
+        await g.adelete(entity_names=["e1"])
+        return nodes, await g.aget_triplets(entity_names=["e1"])
+
+    async def check_availability(url):
+        engine = create_async_engine(url)
+        try:
+            return await acheck_db_availability(engine, check_vector=True)
+        finally:
+            await engine.dispose()
+
+    assert asyncio.run(check_availability(async_url)) == {"vector": True}
+    with pytest.raises(ValueError, match="does not exist"):
+        asyncio.run(check_availability(async_url.set(database="test_missing")))
+
+    assert len(asyncio.run(add())) == 1
+    # a later event loop gets an async engine of its own
+    nodes, triplets = asyncio.run(query_and_delete())
+    assert [n.name for n in nodes] == ["e1"]
+    assert triplets == []
+
+
 class TestPostgresPropertyGraphStore(TestCase):
     @classmethod
-    def setUp(self) -> None:
+    def setUpClass(cls) -> None:
         try:
-            get_store()
+            cls.g = get_store()
         except Exception:
             raise SkipTest("PostgreSQL database is not available")
 
+        # every test runs in a SAVEPOINT of one outer transaction and is rolled
+        # back afterwards, the store's sessions join it instead of connecting
+        cls.conn = cls.g._engine.connect()
+        cls.trans = cls.conn.begin()
+        cls.g._session = sessionmaker(
+            bind=cls.conn,
+            join_transaction_mode="create_savepoint",
+            expire_on_commit=False,
+        )
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        cls.trans.rollback()
+        cls.conn.close()
+
+    def setUp(self) -> None:
+        self.nested = self.conn.begin_nested()
+
         self.e1 = EntityNode(name="e1", properties={"p1": "v1"})
         self.e2 = EntityNode(name="e2")
         self.r = Relation(label="r", source_id=self.e1.id, target_id=self.e2.id)
 
+    def tearDown(self) -> None:
+        self.nested.rollback()
+
     def test_add(self):
-        g = get_store()
+        g = self.g
 
         g.upsert_nodes([self.e1, self.e2])
         g.upsert_relations([self.r])
@@ -41,7 +318,7 @@ class TestPostgresPropertyGraphStore(TestCase):
         assert len(g.get_triplets(properties={"p1": "v2"})) == 0
 
     def test_delete_by_entity_names(self):
-        g = get_store()
+        g = self.g
 
         g.upsert_nodes([self.e1, self.e2])
         g.upsert_relations([self.r])
@@ -50,7 +327,7 @@ class TestPostgresPropertyGraphStore(TestCase):
         assert len(g.get_triplets(entity_names=["e1"])) == 0
 
     def test_delete_by_entity_properties(self):
-        g = get_store()
+        g = self.g
 
         g.upsert_nodes([self.e1, self.e2])
         g.upsert_relations([self.r])
@@ -61,9 +338,62 @@ class TestPostgresPropertyGraphStore(TestCase):
         assert len(g.get_triplets(entity_names=["e1"])) == 0
 
     def test_get(self):
-        g = get_store()
+        g = self.g
 
         g.upsert_nodes([self.e1, self.e2])
         assert len(g.get(ids=[self.e1.id])) == 1
         assert len(g.get(ids=[self.e1.id, self.e2.id])) == 2
         assert len(g.get(properties={"p1": "v1"})) == 1
+
+    def test_upsert_existing(self):
+        g = self.g
+
+        g.upsert_nodes([self.e1, self.e2])
+        g.upsert_relations([self.r])
+        g.upsert_nodes([EntityNode(name="e1", properties={"p1": "v2"})])
+        g.upsert_relations([self.r])
+        assert len(g.get_triplets(entity_names=["e1"])) == 1
+        assert len(g.get(properties={"p1": "v1"})) == 0
+        assert len(g.get(properties={"p1": "v2"})) == 1
+
+    def test_delete_by_relation_names(self):
+        g = self.g
+
+        g.upsert_nodes([self.e1, self.e2])
+        g.upsert_relations([self.r])
+        g.delete(relation_names=["r"])
+        assert len(g.get_triplets(entity_names=["e1"])) == 0
+        assert len(g.get(ids=[self.e1.id, self.e2.id])) == 2
+
+    def test_vector_query(self):
+        g = self.g
+
+        e1 = EntityNode(name="e1", embedding=np.full(1024, 0.1, dtype=np.float32))
+        e2_embedding = np.full(1024, 0.2, dtype=np.float32)
+        e2_embedding[-1] = 0.9
+        e2 = EntityNode(name="e2", embedding=e2_embedding)
+        g.upsert_nodes([e1, e2])
+        nodes, scores = g.vector_query(
+            VectorStoreQuery(
+                query_embedding=np.full(1024, 0.1, dtype=np.float32),
+                similarity_top_k=1,
+            )
+        )
+        assert [n.name for n in nodes] == ["e1"]
+        assert scores[0] == pytest.approx(1.0)
+
+    def test_async_add(self):
+        g = self.g
+
+        async def add():
+            await g.aupsert_nodes([self.e1, self.e2])
+            await g.aupsert_relations([self.r])
+            return await g.aget_triplets(entity_names=["e1"])
+
+        async def delete():
+            await g.adelete(entity_names=["e1"])
+            return await g.aget_triplets(entity_names=["e1"])
+
+        assert len(asyncio.run(add())) == 1
+        assert len(g.get_triplets(entity_names=["e1"])) == 1
+        assert asyncio.run(delete()) == []